@@ -9,5 +9,7 @@ if __name__ == "__main__":
         "src.main:app",
         host=config.server_host,
         port=config.server_port,
-        reload=False
+        reload=False,
+        # uvloop (bundled with uvicorn[standard]) when available; asyncio on Windows
+        loop="auto"
     )
@@ -13,4 +13,5 @@ if __name__ == "__main__":
     
     # 啟動 uvicorn，監聽 38000 端口以匹配 Docker 的映射習慣
     # reload=True 方便開發調試
-    uvicorn.run("src.main:app", host="0.0.0.0", port=38000, reload=False)
+    # loop="auto": 可用時使用 uvloop (uvicorn[standard] 已附帶)，Windows 下退回 asyncio
+    uvicorn.run("src.main:app", host="0.0.0.0", port=38000, reload=False, loop="auto")
@@ -58,7 +58,22 @@ class Config:
 
     @property
     def flow_max_retries(self) -> int:
-        return self._config["flow"]["max_retries"]
+        return self._config["flow"].get("max_retries", 3)
+
+    @property
+    def flow_max_concurrent_requests(self) -> int:
+        """Maximum number of in-flight Flow API requests per AT/ST token"""
+        return self._config["flow"].get("max_concurrent_requests", 8)
+
+    @property
+    def flow_max_clients(self) -> int:
+        """Maximum number of curl handles per shared Flow HTTP session"""
+        return self._config["flow"].get("max_clients", 64)
+
+    @property
+    def flow_credits_cache_ttl(self) -> float:
+        """Seconds a get_credits response is reused before querying again"""
+        return self._config["flow"].get("credits_cache_ttl", 5.0)
 
     @property
     def poll_interval(self) -> float:
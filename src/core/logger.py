@@ -1,6 +1,9 @@
 """Debug logger module for detailed API request/response logging"""
+import atexit
 import json
 import logging
+import logging.handlers
+import queue
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
@@ -39,8 +42,14 @@ class DebugLogger:
         )
         file_handler.setFormatter(formatter)
 
+        # Write through a background listener so file I/O never blocks the event loop
+        log_queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(log_queue, file_handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
         # Add handler
-        self.logger.addHandler(file_handler)
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
         # Prevent propagation to root logger
         self.logger.propagate = False
@@ -195,9 +204,14 @@ class DebugLogger:
         self,
         error_message: str,
         status_code: Optional[int] = None,
-        response_text: Optional[str] = None
+        response_text: Optional[str] = None,
+        exc_info: bool = False
     ):
-        """Log API error details to log.txt"""
+        """Log API error details to log.txt
+
+        exc_info=True attaches the traceback of the exception being handled
+        (written by the background listener, no direct stderr output).
+        """
 
         if not config.debug_enabled:
             return
@@ -210,7 +224,7 @@ class DebugLogger:
             if status_code:
                 self.logger.info(f"Status Code: {status_code}")
 
-            self.logger.info(f"Error Message: {error_message}")
+            self.logger.info(f"Error Message: {error_message}", exc_info=exc_info)
 
             if response_text:
                 self.logger.info("\n📦 Error Response:")
@@ -236,6 +236,8 @@ async def lifespan(app: FastAPI):
     if browser_service:
         await browser_service.close()
         print("[OK] Browser captcha service closed")
+    # Close shared Flow HTTP session
+    await flow_client.aclose()
     print("[OK] File cache cleanup task stopped")
     print("[OK] 429 auto-unban task stopped")
 
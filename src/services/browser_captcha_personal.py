@@ -10,14 +10,32 @@ import os
 import sys
 import re
 import traceback
+from collections import defaultdict
+from operator import attrgetter
 from typing import Optional
 
 import nodriver as uc
 from nodriver import cdp
-from typing import Optional, Any, List, Dict
+from typing import Optional, Any, List, Dict, KeysView
 
 from ..core.logger import debug_logger
 
+SESSION_TOKEN_COOKIE = "__Secure-next-auth.session-token"
+SESSION_TOKEN_CACHE_TTL = 30  # 秒；Session Token 有效期以小時計，短時間內重複刷新直接複用
+
+# cookie -> (name, value)
+_cookie_name_value = attrgetter("name", "value")
+
+# 轮询 reCAPTCHA 结果时错误信息的前缀（token 为 base64url 字符，不会以此开头）
+_RECAPTCHA_ERROR_PREFIX = "!"
+
+# reCAPTCHA 结果轮询：间隔从 0.2 秒按 1.5 倍递增至 2 秒 (±20% 抖动)，总时长 20 秒
+_RECAPTCHA_POLL_INITIAL = 0.2
+_RECAPTCHA_POLL_FACTOR = 1.5
+_RECAPTCHA_POLL_MAX = 2.0
+_RECAPTCHA_POLL_JITTER = 0.2
+_RECAPTCHA_POLL_TIMEOUT = 20.0
+
 
 class ResidentTabInfo:
     """常驻标签页信息结构"""
@@ -26,6 +44,27 @@ class ResidentTabInfo:
         self.project_id = project_id
         self.recaptcha_ready = False
         self.created_at = time.time()
+        # 背景導航任務（DOMContentLoaded 後提前返回時，完整載入仍在進行）
+        self.nav_task: Optional[asyncio.Task] = None
+        # 最近一次取得的 Session Token 及其時間 (time.monotonic)
+        self.last_session_token: Optional[str] = None
+        self.last_session_token_ts: float = 0.0
+
+    def get_cached_session_token(self) -> Optional[str]:
+        """返回未過期的 Session Token 快取"""
+        if self.last_session_token and time.monotonic() - self.last_session_token_ts < SESSION_TOKEN_CACHE_TTL:
+            return self.last_session_token
+        return None
+
+    def cache_session_token(self, session_token: str):
+        """記錄最新取得的 Session Token"""
+        self.last_session_token = session_token
+        self.last_session_token_ts = time.monotonic()
+
+    def invalidate_session_token(self):
+        """導航後 Session 可能變化，清除快取"""
+        self.last_session_token = None
+        self.last_session_token_ts = 0.0
 
 
 class BrowserCaptchaService:
@@ -49,7 +88,8 @@ class BrowserCaptchaService:
         
         # 常驻模式相關屬性 (account_id -> {project_id -> ResidentTabInfo})
         self._account_resident_tabs: dict[str, dict[str, ResidentTabInfo]] = {}
-        self._resident_lock = asyncio.Lock()  # 保护常驻标签页操作
+        self._resident_lock = asyncio.Lock()  # 保护跨帳號操作 (close)
+        self._account_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)  # 按帳號保护常驻标签页操作
 
         # 守護進程狀態
         self._watchdog_tasks: dict[str, asyncio.Task] = {}
@@ -261,7 +301,7 @@ class BrowserCaptchaService:
                     debug_logger.log_info(f"[BrowserCaptcha] 🛡️ 守護進程將在 5 秒後自動重啟窗口...")
                     
                     # 清理舊標籤頁緩存，防止重啟後狀態衝突
-                    async with self._resident_lock:
+                    async with self._account_locks[account_id]:
                         if account_id in self._account_resident_tabs:
                              self._account_resident_tabs[account_id] = {}
                              
@@ -383,17 +423,28 @@ class BrowserCaptchaService:
         # 注入执行脚本
         await tab.evaluate(execute_script)
         
+        # 每轮只需一次 evaluate：token 优先，否则返回带前缀的错误信息
+        poll_script = (
+            f"window.{token_var} || "
+            f"(window.{error_var} ? '{_RECAPTCHA_ERROR_PREFIX}' + window.{error_var} : null)"
+        )
+
         # 轮询等待结果（最多 20 秒，因为增加了延迟）
+        # 间隔逐步拉长：快速返回时更早取得 token，慢时减少 evaluate 次数
         token = None
-        for i in range(40):
-            await tab.sleep(0.5)
-            token = await tab.evaluate(f"window.{token_var}")
-            if token:
-                break
-            error = await tab.evaluate(f"window.{error_var}")
-            if error:
-                debug_logger.log_error(f"[BrowserCaptcha] reCAPTCHA 错误: {error}")
-                break
+        delay = _RECAPTCHA_POLL_INITIAL
+        deadline = time.monotonic() + _RECAPTCHA_POLL_TIMEOUT
+        while time.monotonic() < deadline:
+            await tab.sleep(delay * random.uniform(1 - _RECAPTCHA_POLL_JITTER, 1 + _RECAPTCHA_POLL_JITTER))
+            delay = min(delay * _RECAPTCHA_POLL_FACTOR, _RECAPTCHA_POLL_MAX)
+            result = await tab.evaluate(poll_script)
+            if not result:
+                continue
+            if result.startswith(_RECAPTCHA_ERROR_PREFIX):
+                debug_logger.log_error(f"[BrowserCaptcha] reCAPTCHA 错误: {result[len(_RECAPTCHA_ERROR_PREFIX):]}")
+            else:
+                token = result
+            break
         
         # 清理临时变量
         try:
@@ -434,7 +485,8 @@ class BrowserCaptchaService:
         browser = self.browser_instances[account_id]
         
         # 尝试从常驻标签页获取 token
-        async with self._resident_lock:
+        async with self._account_locks[account_id]:
+            await self._wait_pending_navigations(account_id)
             if account_id not in self._account_resident_tabs:
                 self._account_resident_tabs[account_id] = {}
             
@@ -468,6 +520,10 @@ class BrowserCaptchaService:
                 
                 debug_logger.log_info(f"[BrowserCaptcha] ✅ 帳號 [{account_id}] 已為 project_id={project_id} 成功創建並穩定停留")
         
+        # 若常駐標籤頁仍在背景完成載入，先等待其就緒
+        if resident_info and resident_info.nav_task and not resident_info.nav_task.done():
+            await asyncio.shield(resident_info.nav_task)
+
         # 使用常驻标签页生成 token
         if resident_info and resident_info.tab:
             # [FIX] 每次獲取 token 前都進行輕量級網址檢查/恢復 (Regex 比對 + Session 注入)
@@ -496,7 +552,7 @@ class BrowserCaptchaService:
         
         return None, None
 
-    async def _navigate_resident_tab(self, resident_info: ResidentTabInfo, browser, caller: str = "UNKNOWN", st: Optional[str] = None) -> bool:
+    async def _navigate_resident_tab(self, resident_info: ResidentTabInfo, browser, caller: str = "UNKNOWN", st: Optional[str] = None, dom_ready: Optional[asyncio.Event] = None) -> bool:
         """為指定 ResidentTabInfo 進行導航、初始化與 Session 注入
         
         Args:
@@ -504,11 +560,13 @@ class BrowserCaptchaService:
             browser: nodriver 瀏覽器實例
             caller: 呼叫來源標籤 (e.g., API, WATCHDOG, REFRESH)
             st: 選配的 Session Token 用於注入注入失效的 Session
+            dom_ready: 選配的事件，DOMContentLoaded (readyState 為 interactive) 時設置
             
         Returns:
             bool: 是否初始化成功
         """
         project_id = resident_info.project_id
+        resident_info.invalidate_session_token()
         try:
             sys.stderr.write(f"\n[DEBUG_TRACE] [{caller}] Entering _navigate_resident_tab. ProjectID: {project_id}\n")
             # [REVERTED] Use project-specific URL as requested by user.
@@ -554,7 +612,6 @@ class BrowserCaptchaService:
                                 # 僅對 labs.google 域名設置 __Secure-next-auth.session-token
                                 try:
                                     # [FIX] 改用底層 CDP 指令設置 Cookie，避開版本不相容問題
-                                    from nodriver import cdp
                                     await tab.send(cdp.network.set_cookie(
                                         name="__Secure-next-auth.session-token",
                                         value=st,
@@ -595,6 +652,8 @@ class BrowserCaptchaService:
                 try:
                     await asyncio.sleep(1)
                     ready_state = await tab.evaluate("document.readyState")
+                    if dom_ready is not None and ready_state in ("interactive", "complete"):
+                        dom_ready.set()
                     if ready_state == "complete":
                         page_loaded = True
                         sys.stderr.write(f"[DEBUG_TRACE] Page loaded (retry {retry})\n")
@@ -737,31 +796,18 @@ class BrowserCaptchaService:
             # 篩選僅與 Google 相關的 Cookie，避免 Header 過大
             allowed_domains = [".google.com", "labs.google", "google.com", "www.google.com"]
             
-            cookie_list = []
-            st_found = False
-            
-            for cookie in cookies_obj:
-                # 檢查域名是否匹配
-                match = False
-                for domain in allowed_domains:
-                    if domain in cookie.domain:
-                        match = True
-                        break
-                
-                if not match:
-                    continue
-                
-                # 格式化: name=value
-                cookie_list.append(f"{cookie.name}={cookie.value}")
-                
-                if "__Secure-next-auth.session-token" in cookie.name:
-                    st_found = True
+            matched_cookies = [
+                cookie for cookie in cookies_obj
+                if any(domain in cookie.domain for domain in allowed_domains)
+            ]
             
-            if not cookie_list:
+            if not matched_cookies:
                 return None
                 
-            full_cookies = "; ".join(cookie_list)
-            sys.stderr.write(f"[DEBUG_TRACE] _get_full_cookies: Filtered to {len(cookie_list)}/56+ cookies. ST_Found: {st_found}\n")
+            # 格式化: name=value
+            full_cookies = "; ".join("=".join(_cookie_name_value(cookie)) for cookie in matched_cookies)
+            st_found = SESSION_TOKEN_COOKIE in self._cookie_map(matched_cookies)
+            sys.stderr.write(f"[DEBUG_TRACE] _get_full_cookies: Filtered to {len(matched_cookies)}/56+ cookies. ST_Found: {st_found}\n")
             return full_cookies
         except Exception as e:
             sys.stderr.write(f"[DEBUG_TRACE] _get_full_cookies EXCEPTION: {e}\n")
@@ -787,36 +833,44 @@ class BrowserCaptchaService:
 
     async def stop_all_for_account(self, account_id: str):
         """關閉特定帳號的所有資源"""
-        # 關閉常駐標籤頁
-        if account_id in self._account_resident_tabs:
-            for project_id in list(self._account_resident_tabs[account_id].keys()):
-                await self._close_resident_tab(account_id, project_id)
-            del self._account_resident_tabs[account_id]
-            
-        # 關閉瀏覽器
-        browser = self.browser_instances.pop(account_id, None)
-        if browser:
-            try:
-                browser.stop()
-            except Exception:
-                pass
+        async with self._account_locks[account_id]:
+            # 關閉常駐標籤頁
+            if account_id in self._account_resident_tabs:
+                for project_id in list(self._account_resident_tabs[account_id].keys()):
+                    await self._close_resident_tab(account_id, project_id)
+                del self._account_resident_tabs[account_id]
+
+            # 關閉瀏覽器
+            browser = self.browser_instances.pop(account_id, None)
+            if browser:
+                try:
+                    browser.stop()
+                except Exception:
+                    pass
 
     async def keep_alive_all_tabs(self):
         """主動對所有常駐標籤頁進行刷新，防止 Session 被 Google 判定為閒置"""
         # [FIX] 暫時關閉全域 reload，因為這會導致使用者看到的視窗被意外刷新跳轉。
         # 改為執行輕量級指令，只要讓瀏覽器有活動即可。
         debug_logger.log_info("[BrowserCaptcha] 正在執行輕量級標籤頁保活 (Activity Only)...")
-        async with self._resident_lock:
-            for account_id, projects in self._account_resident_tabs.items():
-                for project_id, resident_info in projects.items():
-                    if resident_info and resident_info.tab:
-                        try:
-                            # [FIX] 改用 evaluate 而非 reload，徹底解決「第二次跳轉」的問題
-                            await resident_info.tab.evaluate("console.log('Keep-alive check')")
-                            # 隨機等待 1s，維持心跳感
-                            await asyncio.sleep(1)
-                        except Exception as e:
-                            debug_logger.log_warning(f"[BrowserCaptcha] 帳號 [{account_id}] 保活失敗: {e}")
+        # 各帳號僅持有自己的鎖，帳號之間並行保活
+        await asyncio.gather(
+            *(self._keep_alive_account(account_id) for account_id in list(self._account_resident_tabs))
+        )
+
+    async def _keep_alive_account(self, account_id: str):
+        """對單一帳號的常駐標籤頁執行保活"""
+        async with self._account_locks[account_id]:
+            await self._wait_pending_navigations(account_id)
+            for project_id, resident_info in list(self._account_resident_tabs.get(account_id, {}).items()):
+                if resident_info and resident_info.tab:
+                    try:
+                        # [FIX] 改用 evaluate 而非 reload，徹底解決「第二次跳轉」的問題
+                        await resident_info.tab.evaluate("console.log('Keep-alive check')")
+                        # 隨機等待 1s，維持心跳感
+                        await asyncio.sleep(1)
+                    except Exception as e:
+                        debug_logger.log_warning(f"[BrowserCaptcha] 帳號 [{account_id}] 保活失敗: {e}")
 
     async def _minimize_window(self, account_id: str):
         """強制最小化特定帳號的瀏覽器視窗"""
@@ -847,6 +901,15 @@ class BrowserCaptchaService:
     async def refresh_session_token(self, project_id: str, account_id: str = "default") -> Optional[str]:
         """从常驻标签页获取最新的 Session Token"""
         account_id = account_id.lower()
+
+        # TTL 內直接返回快取，跳過瀏覽器檢查與 CDP 往返
+        resident_info = self._account_resident_tabs.get(account_id, {}).get(project_id)
+        if resident_info:
+            cached_token = resident_info.get_cached_session_token()
+            if cached_token:
+                debug_logger.log_info(f"[BrowserCaptcha] 帳號 [{account_id}] 使用快取的 Session Token (project: {project_id})")
+                return cached_token
+
         # 确保浏览器已初始化
         await self.initialize_for_account(account_id)
         browser = self.browser_instances[account_id]
@@ -855,7 +918,8 @@ class BrowserCaptchaService:
         debug_logger.log_info(f"[BrowserCaptcha] 开始刷新 Session Token (project: {project_id})...")
         
         # 尝试获取或创建常驻标签页
-        async with self._resident_lock:
+        async with self._account_locks[account_id]:
+            await self._wait_pending_navigations(account_id)
             if account_id not in self._account_resident_tabs:
                 self._account_resident_tabs[account_id] = {}
             
@@ -869,10 +933,15 @@ class BrowserCaptchaService:
                 self._account_resident_tabs[account_id][project_id] = resident_info
                 
                 # REFRESH_ST 時不一定有 new st，但導航邏輯會處理基本跳轉
-                success = await self._navigate_resident_tab(resident_info, browser, caller="REFRESH_ST")
-                if not success:
+                # DOMContentLoaded 後即並行輪詢 Cookie，不必等待頁面與 reCAPTCHA 完全就緒
+                session_token = await self._navigate_and_poll_session_token(account_id, resident_info, browser)
+                if session_token:
+                    resident_info.cache_session_token(session_token)
+                    duration_ms = (time.time() - start_time) * 1000
+                    debug_logger.log_info(f"[BrowserCaptcha] 帳號 [{account_id}] ✅ Session Token 获取成功（DOM 就緒即取得，耗时 {duration_ms:.0f}ms）")
+                    return session_token
+                if self._account_resident_tabs[account_id].get(project_id) is not resident_info:
                     debug_logger.log_warning(f"[BrowserCaptcha] 帳號 [{account_id}] 無法為 project_id={project_id} 創建常駐標籤頁")
-                    del self._account_resident_tabs[account_id][project_id]
                     return None
         
         if not resident_info or not resident_info.tab:
@@ -895,12 +964,7 @@ class BrowserCaptchaService:
             
             try:
                 # 使用 nodriver 的 cookies API 获取所有 cookies
-                cookies = await browser.cookies.get_all()
-                
-                for cookie in cookies:
-                    if cookie.name == "__Secure-next-auth.session-token":
-                        session_token = cookie.value
-                        break
+                session_token = await self._read_session_token(browser)
                         
             except Exception as e:
                 debug_logger.log_warning(f"[BrowserCaptcha] 帳號 [{account_id}] 通过 cookies API 获取失败: {e}，尝试从 document.cookie 获取...")
@@ -920,6 +984,7 @@ class BrowserCaptchaService:
             duration_ms = (time.time() - start_time) * 1000
             
             if session_token:
+                resident_info.cache_session_token(session_token)
                 debug_logger.log_info(f"[BrowserCaptcha] 帳號 [{account_id}] ✅ Session Token 获取成功（耗时 {duration_ms:.0f}ms）")
                 return session_token
             else:
@@ -930,7 +995,8 @@ class BrowserCaptchaService:
             debug_logger.log_error(f"[BrowserCaptcha] 帳號 [{account_id}] 刷新 Session Token 異常: {str(e)}")
             
             # 常驻标签页可能已失效，嘗試重新導航
-            async with self._resident_lock:
+            async with self._account_locks[account_id]:
+                await self._wait_pending_navigations(account_id)
                 # 不再重建對象，直接導航現有分頁
                 resident_info = self._account_resident_tabs.get(account_id, {}).get(project_id)
                 if resident_info and resident_info.tab:
@@ -938,23 +1004,105 @@ class BrowserCaptchaService:
                     if success:
                         # 再次嘗試獲取 Cookie
                         try:
-                            cookies = await browser.cookies.get_all()
-                            for cookie in cookies:
-                                if cookie.name == "__Secure-next-auth.session-token":
-                                    debug_logger.log_info(f"[BrowserCaptcha] 帳號 [{account_id}] ✅ 重刷後 Session Token 獲獲成功")
-                                    return cookie.value
+                            session_token = await self._read_session_token(browser)
+                            if session_token:
+                                resident_info.cache_session_token(session_token)
+                                debug_logger.log_info(f"[BrowserCaptcha] 帳號 [{account_id}] ✅ 重刷後 Session Token 獲獲成功")
+                                return session_token
                         except Exception:
                             pass
             
             return None
 
+    async def _wait_pending_navigations(self, account_id: str) -> None:
+        """等待該帳號常駐標籤頁的背景導航完成（持有帳號鎖時呼叫，避免同一分頁被並行導航）"""
+        pending = [
+            info.nav_task for info in self._account_resident_tabs.get(account_id, {}).values()
+            if info.nav_task and not info.nav_task.done()
+        ]
+        if pending:
+            # asyncio.wait 不會因呼叫方取消而取消背景導航
+            await asyncio.wait(pending)
+
+    @staticmethod
+    def _cookie_map(cookies) -> Dict[str, str]:
+        """将 cookie 对象列表转为 name -> value 映射"""
+        return dict(map(_cookie_name_value, cookies))
+
+    async def _read_session_token(self, browser) -> Optional[str]:
+        """通过 nodriver cookies API 读取 __Secure-next-auth.session-token"""
+        cookies = await browser.cookies.get_all()
+        return self._cookie_map(cookies).get(SESSION_TOKEN_COOKIE)
+
+    async def _poll_session_token(self, browser, interval: float = 0.5, previous: Optional[str] = None) -> str:
+        """轮询 cookies 直到出现与 previous 不同的 Session Token（由呼叫方取消）
+
+        瀏覽器 cookie 罐在導航前已持有舊的 Session Token，需等頁面輪換後的新值
+        """
+        while True:
+            try:
+                session_token = await self._read_session_token(browser)
+                if session_token and session_token != previous:
+                    return session_token
+            except Exception:
+                pass
+            await asyncio.sleep(interval)
+
+    async def _navigate_and_poll_session_token(self, account_id: str, resident_info: ResidentTabInfo, browser) -> Optional[str]:
+        """导航常驻标签页，并在 DOMContentLoaded 后并行轮询 Session Token
+
+        若 Session Token 先于完整加载出现则立即返回，导航在背景继续（记录于
+        resident_info.nav_task，失败时自动移除该常驻标签页）。
+
+        Returns:
+            提前取得的 Session Token；导航先结束时返回 None（失败时已移除常驻标签页）
+        """
+        project_id = resident_info.project_id
+        # 記錄導航前的 Session Token，僅接受頁面輪換後的新值
+        try:
+            previous_token = await self._read_session_token(browser)
+        except Exception:
+            previous_token = None
+        dom_ready = asyncio.Event()
+        nav_task = asyncio.create_task(
+            self._navigate_resident_tab(resident_info, browser, caller="REFRESH_ST", dom_ready=dom_ready)
+        )
+        resident_info.nav_task = nav_task
+
+        def _discard_if_failed(task: asyncio.Task):
+            if task.cancelled() or task.exception() is not None or not task.result():
+                tabs = self._account_resident_tabs.get(account_id, {})
+                if tabs.get(project_id) is resident_info:
+                    del tabs[project_id]
+
+        dom_task = asyncio.create_task(dom_ready.wait())
+        poll_task: Optional[asyncio.Task] = None
+        try:
+            await asyncio.wait({nav_task, dom_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not nav_task.done():
+                poll_task = asyncio.create_task(self._poll_session_token(browser, previous=previous_token))
+                await asyncio.wait({nav_task, poll_task}, return_when=asyncio.FIRST_COMPLETED)
+                if poll_task.done():
+                    nav_task.add_done_callback(_discard_if_failed)
+                    return poll_task.result()
+        except asyncio.CancelledError:
+            nav_task.cancel()
+            raise
+        finally:
+            dom_task.cancel()
+            if poll_task and not poll_task.done():
+                poll_task.cancel()
+
+        _discard_if_failed(nav_task)
+        return None
+
     # ========== 状态查询 ==========
  
     def is_resident_mode_active(self, account_id: Optional[str] = None) -> bool:
         """检查是否有任何常驻标签页激活"""
         if account_id:
-            return len(self._account_resident_tabs.get(account_id, {})) > 0
-        return any(len(tabs) > 0 for tabs in self._account_resident_tabs.values())
+            return bool(self._account_resident_tabs.get(account_id))
+        return any(self._account_resident_tabs.values())
  
     def get_resident_count(self, account_id: Optional[str] = None) -> int:
         """获取当前常驻标签页数量"""
@@ -962,12 +1110,17 @@ class BrowserCaptchaService:
             return len(self._account_resident_tabs.get(account_id, {}))
         return sum(len(tabs) > 0 for tabs in self._account_resident_tabs.values())
  
+    def iter_resident_project_ids(self, account_id: str) -> KeysView[str]:
+        """获取当前常驻的 project_id 视图（不复制，仅供遍历/成员判断）
+
+        注意：视图会随常驻标签页增删而变化，需要快照请使用 get_resident_project_ids
+        """
+        return self._account_resident_tabs.get(account_id, {}).keys()
+
     def get_resident_project_ids(self, account_id: str) -> list[str]:
-        """获取所有当前常驻的 project_id 列表"""
-        return list(self._account_resident_tabs.get(account_id, {}).keys())
+        """获取所有当前常驻的 project_id 列表（快照）"""
+        return list(self.iter_resident_project_ids(account_id))
 
     def get_resident_project_id(self, account_id: str) -> Optional[str]:
         """获取当前常驻的 project_id（向后兼容，返回第一个）"""
-        if account_id in self._account_resident_tabs and self._account_resident_tabs[account_id]:
-            return next(iter(self._account_resident_tabs[account_id].keys()))
-        return None
\ No newline at end of file
+        return next(iter(self.iter_resident_project_ids(account_id)), None)
\ No newline at end of file
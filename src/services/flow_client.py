@@ -1,29 +1,111 @@
 """Flow API Client for VideoFX (Veo)"""
 import time
+import os
 import uuid
 import random
 import base64
+import re
 import sys
 import asyncio
-from typing import Dict, Any, Optional, List
+import functools
+import weakref
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Awaitable, Callable, Hashable, Tuple
+import orjson
+from curl_cffi import CurlHttpVersion
 from curl_cffi.requests import AsyncSession
+from curl_cffi.requests.errors import RequestsError
+try:
+    # SIMD 加速的 base64 编码 (可选依赖)，大图上传时明显快于标准库
+    from pybase64 import b64encode_as_string as _b64encode_str
+except ImportError:
+    def _b64encode_str(data: bytes) -> str:
+        return base64.b64encode(data).decode('ascii')
 from ..core.logger import debug_logger
 from ..core.config import config
+from ..core.database import Database
+from .proxy_manager import ProxyManager
+
+# [FIX] Force match TLS fingerprint (impersonate="chrome110")
+# Using a newer UA (like 130+) with an older TLS fingerprint (110) is a major bot signal.
+_FALLBACK_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
+
+# User-Agent 缓存上限 (LRU 淘汰)
+_UA_CACHE_MAX = 10000
+
+# UA 平台关键字 -> (sec-ch-ua-platform, sec-ch-ua-mobile)，一次正则扫描取第一个命中项
+_UA_PLATFORM_RE = re.compile(r"Windows|Macintosh|Linux")
+_UA_HINT_MAP = {
+    "Windows": ('"Windows"', "?0"),
+    "Macintosh": ('"macOS"', "?0"),
+    "Linux": ('"Linux"', "?0"),
+}
+
+# 瞬时错误重试：状态码集合与指数退避参数 (秒)
+# POST (生成类请求) 仅在上游明确拒绝处理时重试，避免重复提交
+_RETRYABLE_STATUS_GET = frozenset({429, 500, 502, 503, 504})
+_RETRYABLE_STATUS_POST = frozenset({429, 503})
+_RETRY_BACKOFF_BASE = 0.5
+_RETRY_BACKOFF_CAP = 8.0
+_RETRY_BACKOFF_JITTER = 0.5
+
+# sessionId 前缀 (格式 ";<毫秒时间戳>"，与 Flow 网页端一致)
+_SESSION_ID_PREFIX = ";"
+# 当前请求上下文的 sessionId：同一次生成 (含上传、重试) 共用一个，便于日志关联
+_SESSION_ID: ContextVar[Optional[str]] = ContextVar("flow_session_id", default=None)
+
+
+def _new_session_id() -> str:
+    """生成新的 sessionId"""
+    return _SESSION_ID_PREFIX + str(time.time_ns() // 1_000_000)
+
+
+# 视频状态轮询合并窗口 (秒)：窗口内同一 AT 的查询合并为一次批量请求
+_STATUS_BATCH_WINDOW = 0.05
+
+
+class FlowAPIError(Exception):
+    """Flow API 返回非 2xx 状态码 (保留状态码与响应体，供重试逻辑判断)"""
+
+    def __init__(self, status: int, body: str):
+        self.status = status
+        self.body = body
+        super().__init__(f"Flow API request failed: {status} - {body}")
 
 
 class FlowClient:
     """VideoFX API客户端"""
 
-    def __init__(self, proxy_manager, db=None):
+    def __init__(self, proxy_manager: ProxyManager, db: Optional[Database] = None) -> None:
         self.proxy_manager = proxy_manager
         self.db = db  # Database instance for captcha config
         self.labs_base_url = config.flow_labs_base_url  # https://labs.google/fx/api
         self.api_base_url = config.flow_api_base_url    # https://aisandbox-pa.googleapis.com/v1
         self.timeout = config.flow_timeout
-        # 缓存每个账号的 User-Agent
-        self._user_agent_cache = {}
+        self._max_retries = max(1, config.flow_max_retries)
+        # 缓存每个账号的 User-Agent (有界 LRU)
+        self._user_agent_cache: "OrderedDict[str, str]" = OrderedDict()
         # [FIX] Initialize browser service reference
         self.browser_service = None
+        # 实例私有随机数生成器 (生成 seed / sceneId，避免走全局 random 状态)
+        # 仅在初始化时读取一次 os.urandom 作为种子，之后不再产生系统调用
+        self._rng = random.Random(os.urandom(16))
+        # 共享 HTTP 会话 (复用 TCP/TLS 连接)，首次请求时创建
+        # 按代理地址区分 (None 表示直连)，代理轮换时各自保留已建立的连接
+        self._sessions: Dict[Optional[str], AsyncSession] = {}
+        self._session_lock = asyncio.Lock()
+        # 余额查询结果缓存: at -> (result, 获取时间)
+        self._credits_cache: Dict[str, Tuple[dict, float]] = {}
+        self._credits_ttl = config.flow_credits_cache_ttl
+        # 在途请求合并 (single-flight): key -> 共享的执行任务
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 视频状态合并查询: at -> (待查询 operations, operation name -> Future, account_id)
+        self._status_batches: Dict[str, Tuple[List[Dict], Dict[str, asyncio.Future], Optional[str]]] = {}
+        self._status_flush_tasks: Dict[str, asyncio.Task] = {}
+        # 按 AT/ST 限制同时在途的 Flow API 请求数，单个 token 的批量并发不会压垮上游
+        # 也不会占满其他账号的额度；无请求使用时自动回收 (弱引用)
+        self._request_semaphores: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
 
         # [UPSTREAM] Default client headers to mimic Chrome/Android as per upstream flow2api
         self._default_client_headers = {
@@ -38,8 +120,12 @@ class FlowClient:
             "x-browser-year": "2026",
             "x-client-data": "CJS2yQEIpLbJAQipncoBCNj9ygEIlKHLAQiFoM0BGP6lzwE="
         }
+        # 每个请求共享的基础请求头模板
+        self._base_headers = {**self._default_client_headers, "Content-Type": "application/json"}
+        # UA 字符串 -> 解析后的 (platform, mobile)，UA 按账号固定，数量很少
+        self._ua_hint_cache: Dict[str, Tuple[str, str]] = {}
 
-    async def _generate_user_agent(self, account_id: str = None) -> str:
+    async def _generate_user_agent(self, account_id: Optional[str] = None) -> str:
         """基于账号ID生成固定的 User-Agent
         
         Args:
@@ -56,8 +142,10 @@ class FlowClient:
         account_id = account_id.lower()
 
         # 如果已缓存，直接返回
-        if account_id in self._user_agent_cache:
-            return self._user_agent_cache[account_id]
+        cached = self._user_agent_cache.get(account_id)
+        if cached is not None:
+            self._user_agent_cache.move_to_end(account_id)
+            return cached
             
         # [FIX] Re-enable UA sync from browser service.
         # It's CRITICAL that the API Request User-Agent matches the Browser where the reCAPTCHA token was generated.
@@ -65,35 +153,78 @@ class FlowClient:
             try:
                 browser_ua = await self.browser_service.get_user_agent(account_id)
                 if browser_ua:
-                    self._user_agent_cache[account_id] = browser_ua
+                    self._cache_user_agent(account_id, browser_ua)
                     debug_logger.log_info(f"[DEBUG_UA] Synced UA from Browser: {browser_ua}")
                     return browser_ua
             except Exception as e:
                 debug_logger.log_warning(f"Failed to sync UA from browser: {e}")
         
-        # 使用账号ID作为随机种子，确保同一账号生成相同的UA
-        import hashlib
-        seed = int(hashlib.md5(account_id.encode()).hexdigest()[:8], 16)
-        rng = random.Random(seed)
-        
-        # Chrome 版本池
-        chrome_versions = ["130.0.0.0", "131.0.0.0", "132.0.0.0", "129.0.0.0"]
-        # Firefox 版本池
-        firefox_versions = ["133.0", "132.0", "131.0", "134.0"]
-        # Safari 版本池
-        safari_versions = ["18.2", "18.1", "18.0", "17.6"]
-        # Edge 版本池
-        edge_versions = ["130.0.0.0", "131.0.0.0", "132.0.0.0"]
-
-        # [FIX] Force match TLS fingerprint (impersonate="chrome110")
-        # Using a newer UA (like 130+) with an older TLS fingerprint (110) is a major bot signal.
-        ua = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
+        # 未能从浏览器同步时，所有账号统一使用固定 UA
+        ua = _FALLBACK_USER_AGENT
         
         # 缓存结果
-        self._user_agent_cache[account_id] = ua
+        self._cache_user_agent(account_id, ua)
         
         return ua
 
+    def _resolve_ua_hints(self, ua: str) -> Tuple[str, str]:
+        """根据 UA 得出 (sec-ch-ua-platform, sec-ch-ua-mobile)，按 UA 字符串缓存"""
+        hints = self._ua_hint_cache.get(ua)
+        if hints is None:
+            # Else keep default (Android/?1)
+            hints = (
+                self._default_client_headers["sec-ch-ua-platform"],
+                self._default_client_headers["sec-ch-ua-mobile"],
+            )
+            match = _UA_PLATFORM_RE.search(ua)
+            # Android UA 同样包含 "Linux"，保留默认值
+            if match and not (match.group(0) == "Linux" and "Android" in ua):
+                hints = _UA_HINT_MAP[match.group(0)]
+            if len(self._ua_hint_cache) >= _UA_CACHE_MAX:
+                self._ua_hint_cache.clear()
+            self._ua_hint_cache[ua] = hints
+        return hints
+
+    def _cache_user_agent(self, account_id: str, ua: str) -> None:
+        """写入 UA 缓存，超出上限时淘汰最久未使用的账号"""
+        self._user_agent_cache[account_id] = ua
+        if len(self._user_agent_cache) > _UA_CACHE_MAX:
+            self._user_agent_cache.popitem(last=False)
+
+    async def _get_session(self, proxy_url: Optional[str] = None) -> AsyncSession:
+        """获取绑定到指定代理的共享 AsyncSession (懒加载)"""
+        session = self._sessions.get(proxy_url)
+        if session is None:
+            async with self._session_lock:
+                session = self._sessions.get(proxy_url)
+                if session is None:
+                    # [FIX] chrome124 to match modern UA fingerprints
+                    # HTTP/2 多路复用：并发请求共享同一连接；max_clients 为所有账号共用的句柄上限
+                    session = AsyncSession(
+                        impersonate="chrome124",
+                        http_version=CurlHttpVersion.V2_0,
+                        max_clients=config.flow_max_clients,
+                        proxy=proxy_url
+                    )
+                    self._sessions[proxy_url] = session
+        return session
+
+    def _request_semaphore(self, token: Optional[str]) -> asyncio.Semaphore:
+        """获取指定 AT/ST 的并发限制信号量"""
+        key = token or ""
+        semaphore = self._request_semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(config.flow_max_concurrent_requests)
+            self._request_semaphores[key] = semaphore
+        return semaphore
+
+    async def aclose(self) -> None:
+        """关闭所有共享 HTTP 会话"""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.close()
+
     async def _make_request(
         self,
         method: str,
@@ -108,10 +239,27 @@ class FlowClient:
         cookies: Optional[str] = None
     ) -> Dict[str, Any]:
         """统一HTTP请求处理"""
-        proxy_url = await self.proxy_manager.get_proxy_url()
+        # 确定账号标识
+        # 1. 优先使用传入的 account_id (通常是 email)
+        # 2. 其次尝试从 token 中截取 (不推荐，不稳定)
+        final_account_id = account_id
+        if not final_account_id:
+            if st_token:
+                final_account_id = st_token[:16]
+            elif at_token:
+                final_account_id = at_token[:16]
 
-        if headers is None:
-            headers = {}
+        # 代理配置 (读库) 与 UA (可能需向浏览器同步) 互不依赖，并发获取
+        proxy_url, ua = await asyncio.gather(
+            self.proxy_manager.get_proxy_url(),
+            self._generate_user_agent(final_account_id)
+        )
+
+        # 通用请求头: 基础模板 + 调用方请求头 + UA，一次构建
+        if headers:
+            headers = {**self._base_headers, **headers, "User-Agent": ua}
+        else:
+            headers = {**self._base_headers, "User-Agent": ua}
 
         # [FIX] 徹底禁用 API 請求中的 Cookie 以避開 401 衝突。
         # 根據 upstream 標準，身份驗證應僅依賴 Authorization: Bearer Header。
@@ -127,57 +275,27 @@ class FlowClient:
         if use_at and at_token:
             headers["Authorization"] = f"Bearer {at_token}"
 
-        # 确定账号标识
-        # 1. 优先使用传入的 account_id (通常是 email)
-        # 2. 其次尝试从 token 中截取 (不推荐，不稳定)
-        final_account_id = account_id
-        if not final_account_id:
-            if st_token:
-                final_account_id = st_token[:16]
-            elif at_token:
-                final_account_id = at_token[:16]
+        headers["sec-ch-ua-platform"], headers["sec-ch-ua-mobile"] = self._resolve_ua_hints(ua)
 
-        # 通用请求头
-        # First apply default headers
-        final_headers = self._default_client_headers.copy()
-        # Then update with existing headers
-        final_headers.update(headers)
-        
-        final_headers.update({
-            "Content-Type": "application/json",
-            "User-Agent": await self._generate_user_agent(final_account_id)
-        })
-        
-        # Use final_headers for the request
-        headers = final_headers
-
-        ua = headers.get("User-Agent", "")
-        if "Windows" in ua:
-             headers["sec-ch-ua-platform"] = '"Windows"'
-             headers["sec-ch-ua-mobile"] = "?0"
-        elif "Macintosh" in ua:
-             headers["sec-ch-ua-platform"] = '"macOS"'
-             headers["sec-ch-ua-mobile"] = "?0"
-        elif "Linux" in ua and "Android" not in ua:
-             headers["sec-ch-ua-platform"] = '"Linux"'
-             headers["sec-ch-ua-mobile"] = "?0"
-        # Else keep default (Android/?1)
-
-        # [DEBUG] Print critical headers for diagnosis
-        cookie_val = headers.get("Cookie", "MISSING")
-        masked_cookie = f"{cookie_val[:30]}..." if cookie_val != "MISSING" else "MISSING"
-        auth_val = headers.get("Authorization", "MISSING")
-        masked_auth = f"{auth_val[:20]}..." if auth_val != "MISSING" else "MISSING"
-        
-        sys.stderr.write(f"\n[DEBUG_UA] API Request Cookie (Masked): {masked_cookie}\n")
-        sys.stderr.write(f"[DEBUG_UA] API Request Authorization (Masked): {masked_auth}\n")
-        sys.stderr.write(f"[DEBUG_UA] API Request User-Agent: {headers.get('User-Agent')}\n")
-        sys.stderr.write(f"[DEBUG_UA] API Request Platform: {headers.get('sec-ch-ua-platform')}\n")
-        sys.stderr.write(f"[DEBUG_UA] API Request Mobile: {headers.get('sec-ch-ua-mobile')}\n")
-        sys.stderr.flush()
-
-        # Log request
-        if config.debug_enabled:
+        # 调试开关可在运行时切换，每个请求只读取一次
+        debug_enabled = config.debug_enabled
+
+        if debug_enabled:
+            # [DEBUG] Print critical headers for diagnosis
+            cookie_val = headers.get("Cookie", "MISSING")
+            masked_cookie = f"{cookie_val[:30]}..." if cookie_val != "MISSING" else "MISSING"
+            auth_val = headers.get("Authorization", "MISSING")
+            masked_auth = f"{auth_val[:20]}..." if auth_val != "MISSING" else "MISSING"
+
+            sys.stderr.write(
+                f"\n[DEBUG_UA] API Request Cookie (Masked): {masked_cookie}\n"
+                f"[DEBUG_UA] API Request Authorization (Masked): {masked_auth}\n"
+                f"[DEBUG_UA] API Request User-Agent: {headers.get('User-Agent')}\n"
+                f"[DEBUG_UA] API Request Platform: {headers.get('sec-ch-ua-platform')}\n"
+                f"[DEBUG_UA] API Request Mobile: {headers.get('sec-ch-ua-mobile')}\n"
+            )
+
+            # Log request
             debug_logger.log_request(
                 method=method,
                 url=url,
@@ -186,77 +304,128 @@ class FlowClient:
                 proxy=proxy_url
             )
 
-        start_time = time.time()
+        is_get = method.upper() == "GET"
+        body = None
+        if not is_get:
+            # [FIX] Add Origin and Referer for security/validation
+            headers.setdefault("Origin", "https://labs.google")
+            headers.setdefault("Referer", "https://labs.google/")
+            # 预先以 orjson 序列化请求体 (Content-Type 已设为 application/json)
+            body = orjson.dumps(json_data) if json_data is not None else None
+        retryable_status = _RETRYABLE_STATUS_GET if is_get else _RETRYABLE_STATUS_POST
+        # 持有引用，保证整个请求 (含重试) 期间使用同一信号量
+        request_semaphore = self._request_semaphore(at_token if use_at else st_token)
 
         try:
-            async with AsyncSession() as session:
-                if method.upper() == "GET":
-                    response = await session.get(
-                        url,
-                        headers=headers,
-                        proxy=proxy_url,
-                        timeout=self.timeout,
-                        impersonate="chrome124" # [FIX] Upgrade to chrome124 to match modern UA fingerprints
-                    )
-                else:  # POST
-                    # [FIX] Add Origin and Referer for security/validation
-                    headers.setdefault("Origin", "https://labs.google")
-                    headers.setdefault("Referer", "https://labs.google/")
-                    
-                    response = await session.post(
-                        url,
-                        headers=headers,
-                        json=json_data,
-                        proxy=proxy_url,
-                        timeout=self.timeout,
-                        impersonate="chrome124"
-                    )
+            for attempt in range(self._max_retries):
+                is_last_attempt = attempt + 1 >= self._max_retries
+                # 会话按代理复用 (重试时代理可能已切换)
+                session = await self._get_session(proxy_url)
+                # 耗时仅用于调试日志，关闭调试时不计时
+                start_time = time.monotonic() if debug_enabled else 0.0
+                try:
+                    async with request_semaphore:
+                        if is_get:
+                            response = await session.get(
+                                url,
+                                headers=headers,
+                                timeout=self.timeout
+                            )
+                        else:  # POST
+                            response = await session.post(
+                                url,
+                                headers=headers,
+                                data=body,
+                                timeout=self.timeout
+                            )
+                except RequestsError as e:
+                    # 连接/代理层错误：仅 GET 换代理后重试；
+                    # POST 可能已送达上游 (超时/连接重置)，重放会重复提交生成任务
+                    if is_last_attempt or not is_get:
+                        raise
+                    await self._retry_backoff(attempt, f"{type(e).__name__}: {e}")
+                    proxy_url = await self.proxy_manager.get_proxy_url()
+                    continue
 
-                duration_ms = (time.time() - start_time) * 1000
+                # 响应体只解码一次 (仅调试时需要文本)
+                body_bytes = response.content
+                body_text = None
 
                 # Log response
-                if config.debug_enabled:
+                if debug_enabled:
+                    duration_ms = (time.monotonic() - start_time) * 1000
+                    body_text = body_bytes.decode("utf-8", errors="replace")
                     debug_logger.log_response(
                         status_code=response.status_code,
-                        headers=dict(response.headers),
-                        body=response.text,
+                        headers=response.headers,
+                        body=body_text,
                         duration_ms=duration_ms
                     )
 
-                if not (200 <= response.status_code < 300):
-                    error_text = response.text
-                    sys.stderr.write(f"\n[DEBUG] GOOGLE_API_ERROR Status: {response.status_code}\n")
-                    sys.stderr.write(f"[DEBUG] GOOGLE_API_ERROR Body: {error_text}\n")
-                    sys.stderr.flush()
-                    
-                    debug_logger.log_error(
-                        error_message=f"Flow API status error: {response.status_code}",
-                        status_code=response.status_code,
-                        response_text=error_text
-                    )
-                    raise Exception(f"Flow API request failed: {response.status_code} - {error_text}")
+                if response.status_code in retryable_status and not is_last_attempt:
+                    await self._retry_backoff(attempt, f"HTTP {response.status_code}")
+                    proxy_url = await self.proxy_manager.get_proxy_url()
+                    continue
+                break
+
+            if not (200 <= response.status_code < 300):
+                error_text = body_text if body_text is not None else body_bytes.decode("utf-8", errors="replace")
+                debug_logger.log_error(
+                    error_message=f"Flow API status error: {response.status_code}",
+                    status_code=response.status_code,
+                    response_text=error_text
+                )
+                raise FlowAPIError(response.status_code, error_text)
 
-                return response.json()
+            return orjson.loads(body_bytes)
 
+        except FlowAPIError:
+            raise
         except Exception as e:
             error_msg = str(e)
-            if config.debug_enabled:
+            if debug_enabled:
                 debug_logger.log_error(error_message=f"Request exception: {error_msg}")
             raise Exception(f"Flow API request failed: {error_msg}")
 
+    async def _single_flight(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """相同 key 的并发调用只执行一次，其余调用等待并共享结果 (或异常)"""
+        task = self._inflight.get(key)
+        if task is None:
+            # 在独立任务中执行：发起者被取消 (如客户端断开) 不会中断共享请求
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._single_flight_done, key))
+        # shield: 任一调用方 (包括发起者) 被取消都不影响其他共享者
+        return await asyncio.shield(task)
+
+    def _single_flight_done(self, key: Hashable, task: asyncio.Future) -> None:
+        """共享任务结束：移出在途表，并标记异常已读取 (避免无等待方时的警告)"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _retry_backoff(self, attempt: int, reason: str) -> None:
+        """指数退避 + 随机抖动后返回"""
+        delay = min(_RETRY_BACKOFF_BASE * 2 ** attempt, _RETRY_BACKOFF_CAP) + self._rng.random() * _RETRY_BACKOFF_JITTER
+        debug_logger.log_warning(f"Flow API transient error ({reason}), retry {attempt + 1}/{self._max_retries - 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
     # ========== 认证相关 (使用ST) ==========
 
     async def st_to_at(self, st: str, account_id: Optional[str] = None) -> dict:
-        """ST转AT"""
+        """ST转AT (同一 ST 的并发转换合并为一次请求)"""
         url = f"{self.labs_base_url}/auth/session"
-        result = await self._make_request(
-            method="GET",
-            url=url,
-            use_st=True,
-            st_token=st,
-            account_id=account_id
+        return await self._single_flight(
+            ("st_to_at", st),
+            lambda: self._make_request(
+                method="GET",
+                url=url,
+                use_st=True,
+                st_token=st,
+                account_id=account_id
+            )
         )
-        return result
 
     # ========== 项目管理 (使用ST) ==========
 
@@ -282,7 +451,7 @@ class FlowClient:
         project_id = result["result"]["data"]["json"]["result"]["projectId"]
         return project_id
 
-    async def delete_project(self, st: str, project_id: str, account_id: Optional[str] = None):
+    async def delete_project(self, st: str, project_id: str, account_id: Optional[str] = None) -> None:
         """删除项目"""
         url = f"{self.labs_base_url}/trpc/project.deleteProject"
         json_data = {
@@ -303,17 +472,34 @@ class FlowClient:
     # ========== 余额查询 (使用AT) ==========
 
     async def get_credits(self, at: str, account_id: Optional[str] = None) -> dict:
-        """查询余额"""
+        """查询余额 (短时缓存；同一 AT 的并发查询合并为一次请求)"""
+        entry = self._credits_cache.get(at)
+        if entry and time.monotonic() - entry[1] < self._credits_ttl:
+            return entry[0]
+
         url = f"{self.api_base_url}/credits"
-        result = await self._make_request(
-            method="GET",
-            url=url,
-            use_at=True,
-            at_token=at,
-            account_id=account_id
+        result = await self._single_flight(
+            ("credits", at),
+            lambda: self._make_request(
+                method="GET",
+                url=url,
+                use_at=True,
+                at_token=at,
+                account_id=account_id
+            )
         )
+        now = time.monotonic()
+        # AT 每小时轮换，写入前清理过期条目，避免缓存随进程运行无限增长
+        expired = [key for key, (_, fetched_at) in self._credits_cache.items() if now - fetched_at >= self._credits_ttl]
+        for key in expired:
+            del self._credits_cache[key]
+        self._credits_cache[at] = (result, now)
         return result
 
+    def invalidate_credits(self, at: str) -> None:
+        """丢弃余额缓存 (生成任务消耗额度后调用)"""
+        self._credits_cache.pop(at, None)
+
     # ========== 图片上传 (使用AT) ==========
 
     async def upload_image(
@@ -327,7 +513,7 @@ class FlowClient:
         if aspect_ratio.startswith("VIDEO_"):
             aspect_ratio = aspect_ratio.replace("VIDEO_", "IMAGE_")
 
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        image_base64 = _b64encode_str(image_bytes)
 
         url = f"{self.api_base_url}:uploadUserImage"
         json_data = {
@@ -355,6 +541,20 @@ class FlowClient:
         media_id = result["mediaGenerationId"]["mediaGenerationId"]
         return media_id
 
+    async def upload_images(
+        self,
+        at: str,
+        images: List[bytes],
+        aspect_ratio: str = "IMAGE_ASPECT_RATIO_LANDSCAPE",
+        account_id: Optional[str] = None,
+        return_exceptions: bool = False
+    ) -> List[Any]:
+        """并发上传多张图片,按输入顺序返回mediaGenerationId列表"""
+        return await asyncio.gather(
+            *(self.upload_image(at, image_bytes, aspect_ratio, account_id=account_id) for image_bytes in images),
+            return_exceptions=return_exceptions
+        )
+
     # ========== 图片生成 (使用AT) - 同步返回 ==========
 
     async def generate_image(
@@ -387,7 +587,7 @@ class FlowClient:
                 "tool": "PINHOLE"
             },
             "requests": [{
-                "seed": random.randint(1, 99999),
+                "seed": self._seed(),
                 "imageModelName": model_name,
                 "imageAspectRatio": aspect_ratio,
                 "prompt": prompt,
@@ -404,22 +604,50 @@ class FlowClient:
             account_id=account_id,
             cookies=cookies
         )
+        self.invalidate_credits(at)
 
         return result
 
+    async def generate_images_batch(
+        self,
+        at: str,
+        project_id: str,
+        prompts: List[str],
+        model_name: str,
+        aspect_ratio: str,
+        image_inputs: Optional[List[Dict]] = None,
+        account_id: Optional[str] = None,
+        return_exceptions: bool = False
+    ) -> List[Any]:
+        """并发生成多个提示词的图片,按输入顺序返回结果"""
+        return await asyncio.gather(
+            *(
+                self.generate_image(at, project_id, prompt, model_name, aspect_ratio, image_inputs=image_inputs, account_id=account_id)
+                for prompt in prompts
+            ),
+            return_exceptions=return_exceptions
+        )
+
     # ========== 视频生成 (使用AT) - 异步返回 ==========
 
-    async def generate_video_text(
+    async def _generate_video(
         self,
         at: str,
         project_id: str,
         prompt: str,
         model_key: str,
         aspect_ratio: str,
+        video_inputs: Optional[List[Dict]] = None,
         user_paygate_tier: str = "PAYGATE_TIER_ONE",
-        account_id: Optional[str] = None
+        account_id: Optional[str] = None,
+        label: str = "VIDEO_GENERATION"
     ) -> dict:
-        """文生视频,返回task_id"""
+        """提交视频生成任务 (T2V/I2V/R2V 共用)，返回task_id
+
+        Args:
+            video_inputs: 首尾帧/参考图输入，为空时为文生视频
+            label: 调试日志中的任务类型标签
+        """
         url = f"{self.api_base_url}/video:batchAsyncGenerateVideoText"
 
         final_account_id = account_id if account_id else (at[:16] if at else "default")
@@ -427,42 +655,53 @@ class FlowClient:
         # [FIX] 實施 403/reCAPTCHA 重試邏輯 - 最多重試3次 (參考外部倉庫做法)
         max_retries = 3
         last_error = None
+
+        # 请求体只构建一次，重试时仅刷新 token / sessionId / seed / sceneId
+        request = {
+            "aspectRatio": aspect_ratio,
+            "seed": 0,
+            "textInput": {
+                "prompt": prompt
+            },
+            "videoModelKey": model_key,
+            "metadata": {
+                "sceneId": ""
+            }
+        }
+        if video_inputs:
+            request["videoInputs"] = video_inputs
+
+        recaptcha_context = {
+            "token": None,
+            "applicationType": "RECAPTCHA_APPLICATION_TYPE_WEB"
+        }
+        client_context = {
+            "recaptchaContext": recaptcha_context,
+            "sessionId": "",
+            "projectId": project_id,
+            "tool": "PINHOLE",
+            "userPaygateTier": user_paygate_tier
+        }
+        json_data = {
+            "clientContext": client_context,
+            "requests": [request]
+        }
         
         for retry_attempt in range(max_retries):
-            sys.stderr.write(f"\n[DEBUG_RETRY] VIDEO_GENERATION attempt {retry_attempt + 1}/{max_retries}\n")
-            
             recaptcha_token, cookies = await self._get_recaptcha_token(project_id, account_id=final_account_id, action="VIDEO_GENERATION") or (None, None)
             
-            # [DEBUG] Verify token is obtained and not empty
-            token_len = len(recaptcha_token) if recaptcha_token else 0
-            sys.stderr.write(f"[DEBUG_TOKEN] reCAPTCHA Token Length: {token_len}, First 20 chars: {recaptcha_token[:20] if recaptcha_token else 'EMPTY'}\n")
+            if config.debug_enabled:
+                # [DEBUG] Verify token is obtained and not empty
+                token_len = len(recaptcha_token) if recaptcha_token else 0
+                sys.stderr.write(
+                    f"\n[DEBUG_RETRY] {label} attempt {retry_attempt + 1}/{max_retries}\n"
+                    f"[DEBUG_TOKEN] reCAPTCHA Token Length: {token_len}, First 20 chars: {recaptcha_token[:20] if recaptcha_token else 'EMPTY'}\n"
+                )
             
-            session_id = self._generate_session_id()
-            scene_id = str(uuid.uuid4())
-
-            json_data = {
-                "clientContext": {
-                    "recaptchaContext": {
-                        "token": recaptcha_token,
-                        "applicationType": "RECAPTCHA_APPLICATION_TYPE_WEB"
-                    },
-                    "sessionId": session_id,
-                    "projectId": project_id,
-                    "tool": "PINHOLE",
-                    "userPaygateTier": user_paygate_tier
-                },
-                "requests": [{
-                    "aspectRatio": aspect_ratio,
-                    "seed": random.randint(1, 99999),
-                    "textInput": {
-                        "prompt": prompt
-                    },
-                    "videoModelKey": model_key,
-                    "metadata": {
-                        "sceneId": scene_id
-                    }
-                }]
-            }
+            recaptcha_context["token"] = recaptcha_token
+            client_context["sessionId"] = self._generate_session_id()
+            request["seed"] = self._seed()
+            request["metadata"]["sceneId"] = self._new_scene_id()
 
             try:
                 result = await self._make_request(
@@ -474,24 +713,37 @@ class FlowClient:
                     account_id=final_account_id,
                     cookies=cookies
                 )
+                self.invalidate_credits(at)
                 return result
-            except Exception as e:
+            except FlowAPIError as e:
                 last_error = e
                 # 只有在 403 reCAPTCHA 失敗時才重試
-                if "403" in str(e) or "reCAPTCHA" in str(e):
-                    sys.stderr.write(f"[DEBUG_RETRY] 403 Detected, retrying with fresh token...\n")
-                    # 如果有常駐模式，嘗試強制刷新一下頁面
-                    if self.browser_service:
-                        # [HINT] 可在此處增加強制刷新邏輯
-                        pass
+                if e.status == 403 or "reCAPTCHA" in e.body:
+                    if config.debug_enabled:
+                        sys.stderr.write(f"[DEBUG_RETRY] 403 Detected in {label}, retrying with fresh token...\n")
                     continue
-                else:
-                    # 其他錯誤（如 401, 500）直接拋出，不重試
-                    raise e
+                # 其他錯誤（如 401, 500）直接拋出，不重試
+                raise e
                     
         # 如果重試完仍失敗
         raise last_error
 
+    async def generate_video_text(
+        self,
+        at: str,
+        project_id: str,
+        prompt: str,
+        model_key: str,
+        aspect_ratio: str,
+        user_paygate_tier: str = "PAYGATE_TIER_ONE",
+        account_id: Optional[str] = None
+    ) -> dict:
+        """文生视频,返回task_id"""
+        return await self._generate_video(
+            at, project_id, prompt, model_key, aspect_ratio,
+            user_paygate_tier=user_paygate_tier, account_id=account_id, label="VIDEO_GENERATION"
+        )
+
     async def generate_video_start_end(
         self,
         at: str,
@@ -505,73 +757,20 @@ class FlowClient:
         account_id: Optional[str] = None
     ) -> dict:
         """首尾帧视频生成 (I2V)"""
-        url = f"{self.api_base_url}/video:batchAsyncGenerateVideoText"
-
-        final_account_id = account_id if account_id else (at[:16] if at else "default")
-        
-        # [FIX] 實施 403/reCAPTCHA 重試邏輯
-        max_retries = 3
-        last_error = None
-        
-        for retry_attempt in range(max_retries):
-            sys.stderr.write(f"\n[DEBUG_RETRY] VIDEO_I2V (Start-End) attempt {retry_attempt + 1}/{max_retries}\n")
-            recaptcha_token, cookies = await self._get_recaptcha_token(project_id, account_id=final_account_id, action="VIDEO_GENERATION") or (None, None)
-            
-            session_id = self._generate_session_id()
-            scene_id = str(uuid.uuid4())
-
-            json_data = {
-                "clientContext": {
-                    "recaptchaContext": {
-                        "token": recaptcha_token,
-                        "applicationType": "RECAPTCHA_APPLICATION_TYPE_WEB"
-                    },
-                    "sessionId": session_id,
-                    "projectId": project_id,
-                    "tool": "PINHOLE",
-                    "userPaygateTier": user_paygate_tier
-                },
-                "requests": [{
-                    "aspectRatio": aspect_ratio,
-                    "seed": random.randint(1, 99999),
-                    "textInput": {
-                        "prompt": prompt
-                    },
-                    "videoModelKey": model_key,
-                    "videoInputs": [
-                        {
-                            "imageUsageType": "IMAGE_USAGE_TYPE_START_IMAGE",
-                            "mediaId": start_media_id
-                        },
-                        {
-                            "imageUsageType": "IMAGE_USAGE_TYPE_END_IMAGE",
-                            "mediaId": end_media_id
-                        }
-                    ],
-                    "metadata": {
-                        "sceneId": scene_id
-                    }
-                }]
+        video_inputs = [
+            {
+                "imageUsageType": "IMAGE_USAGE_TYPE_START_IMAGE",
+                "mediaId": start_media_id
+            },
+            {
+                "imageUsageType": "IMAGE_USAGE_TYPE_END_IMAGE",
+                "mediaId": end_media_id
             }
-
-            try:
-                result = await self._make_request(
-                    method="POST",
-                    url=url,
-                    json_data=json_data,
-                    use_at=True,
-                    at_token=at,
-                    account_id=account_id,
-                    cookies=cookies
-                )
-                return result
-            except Exception as e:
-                last_error = e
-                if "403" in str(e) or "reCAPTCHA" in str(e):
-                    sys.stderr.write(f"[DEBUG_RETRY] 403 Detected in I2V, retrying...\n")
-                    continue
-                raise e
-        raise last_error
+        ]
+        return await self._generate_video(
+            at, project_id, prompt, model_key, aspect_ratio, video_inputs,
+            user_paygate_tier=user_paygate_tier, account_id=account_id, label="VIDEO_I2V (Start-End)"
+        )
 
     async def generate_video_start_image(
         self,
@@ -585,69 +784,16 @@ class FlowClient:
         account_id: Optional[str] = None
     ) -> dict:
         """单帧视频生成 (I2V)"""
-        url = f"{self.api_base_url}/video:batchAsyncGenerateVideoText"
-
-        final_account_id = account_id if account_id else (at[:16] if at else "default")
-        
-        # [FIX] 實施 403/reCAPTCHA 重試邏輯
-        max_retries = 3
-        last_error = None
-        
-        for retry_attempt in range(max_retries):
-            sys.stderr.write(f"\n[DEBUG_RETRY] VIDEO_I2V (Start-Image) attempt {retry_attempt + 1}/{max_retries}\n")
-            recaptcha_token, cookies = await self._get_recaptcha_token(project_id, account_id=final_account_id, action="VIDEO_GENERATION") or (None, None)
-            
-            session_id = self._generate_session_id()
-            scene_id = str(uuid.uuid4())
-
-            json_data = {
-                "clientContext": {
-                    "recaptchaContext": {
-                        "token": recaptcha_token,
-                        "applicationType": "RECAPTCHA_APPLICATION_TYPE_WEB"
-                    },
-                    "sessionId": session_id,
-                    "projectId": project_id,
-                    "tool": "PINHOLE",
-                    "userPaygateTier": user_paygate_tier
-                },
-                "requests": [{
-                    "aspectRatio": aspect_ratio,
-                    "seed": random.randint(1, 99999),
-                    "textInput": {
-                        "prompt": prompt
-                    },
-                    "videoModelKey": model_key,
-                    "videoInputs": [
-                        {
-                            "imageUsageType": "IMAGE_USAGE_TYPE_START_IMAGE",
-                            "mediaId": start_media_id
-                        }
-                    ],
-                    "metadata": {
-                        "sceneId": scene_id
-                    }
-                }]
+        video_inputs = [
+            {
+                "imageUsageType": "IMAGE_USAGE_TYPE_START_IMAGE",
+                "mediaId": start_media_id
             }
-
-            try:
-                result = await self._make_request(
-                    method="POST",
-                    url=url,
-                    json_data=json_data,
-                    use_at=True,
-                    at_token=at,
-                    account_id=account_id,
-                    cookies=cookies
-                )
-                return result
-            except Exception as e:
-                last_error = e
-                if "403" in str(e) or "reCAPTCHA" in str(e):
-                    sys.stderr.write(f"[DEBUG_RETRY] 403 Detected in I2V-Single, retrying...\n")
-                    continue
-                raise e
-        raise last_error
+        ]
+        return await self._generate_video(
+            at, project_id, prompt, model_key, aspect_ratio, video_inputs,
+            user_paygate_tier=user_paygate_tier, account_id=account_id, label="VIDEO_I2V (Start-Image)"
+        )
 
     async def generate_video_reference_images(
         self,
@@ -661,92 +807,153 @@ class FlowClient:
         account_id: Optional[str] = None
     ) -> dict:
         """参考图视频生成 (R2V)"""
-        url = f"{self.api_base_url}/video:batchAsyncGenerateVideoText"
+        return await self._generate_video(
+            at, project_id, prompt, model_key, aspect_ratio, reference_images,
+            user_paygate_tier=user_paygate_tier, account_id=account_id, label="VIDEO_R2V"
+        )
 
-        final_account_id = account_id if account_id else (at[:16] if at else "default")
-        
-        # [FIX] 實施 403/reCAPTCHA 重試邏輯
-        max_retries = 3
-        last_error = None
-        
-        for retry_attempt in range(max_retries):
-            sys.stderr.write(f"\n[DEBUG_RETRY] VIDEO_R2V attempt {retry_attempt + 1}/{max_retries}\n")
-            recaptcha_token, cookies = await self._get_recaptcha_token(project_id, account_id=final_account_id, action="VIDEO_GENERATION") or (None, None)
-            
-            session_id = self._generate_session_id()
-            scene_id = str(uuid.uuid4())
-
-            json_data = {
-                "clientContext": {
-                    "recaptchaContext": {
-                        "token": recaptcha_token,
-                        "applicationType": "RECAPTCHA_APPLICATION_TYPE_WEB"
-                    },
-                    "sessionId": session_id,
-                    "projectId": project_id,
-                    "tool": "PINHOLE",
-                    "userPaygateTier": user_paygate_tier
-                },
-                "requests": [{
-                    "aspectRatio": aspect_ratio,
-                    "seed": random.randint(1, 99999),
-                    "textInput": {
-                        "prompt": prompt
-                    },
-                    "videoModelKey": model_key,
-                    "videoInputs": reference_images,
-                    "metadata": {
-                        "sceneId": scene_id
-                    }
-                }]
-            }
+    async def generate_videos(
+        self,
+        at: str,
+        requests: List[Dict[str, Any]],
+        account_id: Optional[str] = None,
+        return_exceptions: bool = False
+    ) -> List[Any]:
+        """并发提交多个视频生成任务,按输入顺序返回结果
 
-            try:
-                result = await self._make_request(
-                    method="POST",
-                    url=url,
-                    json_data=json_data,
-                    use_at=True,
-                    at_token=at,
-                    account_id=account_id,
-                    cookies=cookies
-                )
-                return result
-            except Exception as e:
-                last_error = e
-                if "403" in str(e) or "reCAPTCHA" in str(e):
-                    continue
-                raise e
-        raise last_error
+        每个请求为对应 generate_video_* 方法的关键字参数 (不含 at/account_id)：
+        含 reference_images 走 R2V，含 end_media_id 走首尾帧，含 start_media_id 走单帧，否则为文生视频。
+        """
+        def _dispatch(request: Dict[str, Any]) -> Awaitable[dict]:
+            if "reference_images" in request:
+                return self.generate_video_reference_images(at, account_id=account_id, **request)
+            if "end_media_id" in request:
+                return self.generate_video_start_end(at, account_id=account_id, **request)
+            if "start_media_id" in request:
+                return self.generate_video_start_image(at, account_id=account_id, **request)
+            return self.generate_video_text(at, account_id=account_id, **request)
+
+        return await asyncio.gather(
+            *(_dispatch(request) for request in requests),
+            return_exceptions=return_exceptions
+        )
 
     async def check_video_status(self, at: str, operations: List[Dict], account_id: Optional[str] = None) -> dict:
-        """查询视频生成状态"""
+        """查询视频生成状态 (相同 AT + operations 的并发查询合并为一次请求)"""
         url = f"{self.api_base_url}/video:batchCheckAsyncVideoGenerationStatus"
 
         json_data = {
             "operations": operations
         }
 
-        result = await self._make_request(
-            method="POST",
-            url=url,
-            json_data=json_data,
-            use_at=True,
-            at_token=at,
-            account_id=account_id
+        key = ("status", at, orjson.dumps(operations, option=orjson.OPT_SORT_KEYS))
+        return await self._single_flight(
+            key,
+            lambda: self._make_request(
+                method="POST",
+                url=url,
+                json_data=json_data,
+                use_at=True,
+                at_token=at,
+                account_id=account_id
+            )
         )
 
-        return result
+    async def check_video_status_batched(self, at: str, operations: List[Dict], account_id: Optional[str] = None) -> dict:
+        """查询视频生成状态 (合并窗口内同一 AT 的所有轮询合并为一次批量请求)
+
+        返回结构与 check_video_status 相同，仅包含本次传入的 operations
+        """
+        names = [op.get("operation", {}).get("name") for op in operations]
+        if not all(names):
+            # 缺少 operation name 时无法分发结果，直接单独查询
+            return await self.check_video_status(at, operations, account_id=account_id)
+
+        loop = asyncio.get_running_loop()
+        batch = self._status_batches.get(at)
+        if batch is None:
+            batch = ([], {}, account_id)
+            self._status_batches[at] = batch
+            self._status_flush_tasks[at] = loop.create_task(self._flush_status_batch(at))
+
+        pending, waiters, _ = batch
+        futures = []
+        for name, op in zip(names, operations):
+            future = waiters.get(name)
+            if future is None:
+                future = loop.create_future()
+                waiters[name] = future
+                pending.append(op)
+            futures.append(future)
+
+        # shield: 等待方被取消时不影响共享同一 operation 的其他轮询
+        checked = await asyncio.gather(*(asyncio.shield(f) for f in futures))
+        return {"operations": [op for op in checked if op is not None]}
+
+    async def _flush_status_batch(self, at: str) -> None:
+        """合并窗口结束后发出批量查询，并按 operation name 分发结果"""
+        pending, waiters, account_id = self._status_batches[at]
+        try:
+            try:
+                await asyncio.sleep(_STATUS_BATCH_WINDOW)
+            finally:
+                # 窗口关闭，之后的查询进入下一批
+                del self._status_batches[at]
+                self._status_flush_tasks.pop(at, None)
+            result = await self.check_video_status(at, pending, account_id=account_id)
+        except asyncio.CancelledError:
+            for future in waiters.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in waiters.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # 标记异常已读取，避免等待方已取消时产生 "never retrieved" 警告
+                    future.exception()
+            return
+
+        checked = result.get("operations", [])
+        by_name = {op.get("operation", {}).get("name"): op for op in checked}
+        for index, op in enumerate(pending):
+            name = op["operation"]["name"]
+            checked_op = by_name.get(name)
+            if checked_op is None and not any(by_name) and index < len(checked):
+                # 响应未回传 operation name 时按顺序对应
+                checked_op = checked[index]
+            future = waiters[name]
+            if not future.done():
+                future.set_result(checked_op)
+
+    async def check_video_status_batch(
+        self,
+        at: str,
+        operation_groups: List[List[Dict]],
+        account_id: Optional[str] = None,
+        return_exceptions: bool = False
+    ) -> List[Any]:
+        """并发查询多组视频生成状态,按输入顺序返回结果"""
+        return await asyncio.gather(
+            *(self.check_video_status(at, operations, account_id=account_id) for operations in operation_groups),
+            return_exceptions=return_exceptions
+        )
 
     # ========== 任务相关 ==========
     # ... 其他方法保持不变 (从略,如有需要可查阅) ...
 
     async def _get_recaptcha_token(self, project_id: str, account_id: str = "default", action: str = "IMAGE_GENERATION", st: Optional[str] = None) -> Optional[tuple[str, Optional[str]]]:
+        """获取reCAPTCHA token和cookies
+
+        reCAPTCHA Enterprise token 只能验证一次，每个调用方必须取得各自的 token，
+        不做并发合并；浏览器/标签页的预热由 BrowserCaptchaService 按账号串行处理
+        """
+        return await self._fetch_recaptcha_token(project_id, account_id=account_id, action=action, st=st)
+
+    async def _fetch_recaptcha_token(self, project_id: str, account_id: str = "default", action: str = "IMAGE_GENERATION", st: Optional[str] = None) -> Optional[tuple[str, Optional[str]]]:
         """从浏览器服务获取reCAPTCHA token和cookies"""
         
         # [DEBUG] Log start of token acquisition
         sys.stderr.write(f"\n[DEBUG] _get_recaptcha_token started for project: {project_id}, account: {account_id}, action: {action}\n")
-        sys.stderr.flush()
         debug_logger.log_info(f"[DEBUG] _get_recaptcha_token started for project: {project_id}, account: {account_id}, action: {action}")
         
         try:
@@ -771,8 +978,9 @@ class FlowClient:
                 except Exception as db_e:
                     sys.stderr.write(f"[DEBUG] Fetch ST from DB failed: {db_e}\n")
 
-            from .browser_captcha_personal import BrowserCaptchaService
             if not self.browser_service:
+                # 延迟导入 (依赖 nodriver)，仅首次初始化时执行
+                from .browser_captcha_personal import BrowserCaptchaService
                 self.browser_service = await BrowserCaptchaService.get_instance(self.db)
 
             # [FIX] 增加小量交互延遲，確保頁面「熟成」，提升 reCAPTCHA 評分
@@ -785,21 +993,17 @@ class FlowClient:
             if result and result[0]:
                 token, cookies = result
                 sys.stderr.write(f"[DEBUG] _get_recaptcha_token obtained (personal): Yes (Token len={len(token)}, Cookies={'Yes' if cookies else 'No'})\n")
-                sys.stderr.flush()
                 debug_logger.log_info(f"[DEBUG] _get_recaptcha_token obtained (personal): Yes")
                 return token, cookies
             else:
                 sys.stderr.write("[DEBUG] _get_recaptcha_token failed (personal): No token returned\n")
-                sys.stderr.flush()
                 debug_logger.log_error("[DEBUG] _get_recaptcha_token failed (personal): No token returned")
                 return None
 
         except Exception as e:
-            sys.stderr.write(f"[ERROR] Failed to get reCAPTCHA token (personal): {e}\n")
-            import traceback
-            traceback.print_exc()
-            sys.stderr.flush()
-            debug_logger.log_error(f"Failed to get reCAPTCHA token (personal): {e}")
+            # 错误行不受调试开关影响，始终输出；完整 traceback 仅在调试时写入日志
+            sys.stderr.write(f"[ERROR] Failed to get reCAPTCHA token (personal): {type(e).__name__}: {e}\n")
+            debug_logger.log_error(f"Failed to get reCAPTCHA token (personal): {e}", exc_info=True)
             return None
         # The original code had an 'elif' here, which is now unreachable.
         # Assuming the intention is to replace the browser/personal captcha logic entirely.
@@ -810,5 +1014,23 @@ class FlowClient:
         #      pass
         # return None # This return is now handled within the try/except block for the personal service.
 
+    def _seed(self) -> int:
+        """生成请求 seed"""
+        return self._rng.randint(1, 99999)
+
+    def _new_scene_id(self) -> str:
+        """生成 sceneId (UUID4)"""
+        return str(uuid.UUID(int=self._rng.getrandbits(128), version=4))
+
     def _generate_session_id(self) -> str:
-        return f";{int(time.time() * 1000)}"
+        """返回当前请求上下文的 sessionId，未设置时生成"""
+        session_id = _SESSION_ID.get()
+        if session_id is None:
+            session_id = _new_session_id()
+            _SESSION_ID.set(session_id)
+        return session_id
+
+    @staticmethod
+    def reset_session_id() -> None:
+        """在请求入口调用：立即生成新的 sessionId，之后派生的子任务 (如并发上传) 继承同一个值"""
+        _SESSION_ID.set(_new_session_id())
@@ -2,6 +2,7 @@
 import asyncio
 import base64
 import json
+import sys
 import time
 from typing import Optional, AsyncGenerator, List, Dict, Any
 from ..core.logger import debug_logger
@@ -366,6 +367,8 @@ class GenerationHandler:
         """
         start_time = time.time()
         token = None
+        # 本次生成内的上传/生成/重试共用同一个 sessionId
+        self.flow_client.reset_session_id()
 
         # 1. 验证模型
         if model not in MODEL_CONFIG:
@@ -565,20 +568,22 @@ class GenerationHandler:
                 if stream:
                     yield self._create_stream_chunk(f"上传 {len(images)} 张参考图片...\n")
 
-                # 支持多图输入
-                for idx, image_bytes in enumerate(images):
-                    media_id = await self.flow_client.upload_image(
-                        at=token.at,
-                        image_bytes=image_bytes,
-                        aspect_ratio=model_config["aspect_ratio"],
-                        account_id=token.email
-                    )
-                    image_inputs.append({
+                # 支持多图输入 (并发上传)
+                media_ids = await self.flow_client.upload_images(
+                    at=token.at,
+                    images=images,
+                    aspect_ratio=model_config["aspect_ratio"],
+                    account_id=token.email
+                )
+                image_inputs = [
+                    {
                         "name": media_id,
                         "imageInputType": "IMAGE_INPUT_TYPE_REFERENCE"
-                    })
-                    if stream:
-                        yield self._create_stream_chunk(f"已上传第 {idx + 1}/{len(images)} 张图片\n")
+                    }
+                    for media_id in media_ids
+                ]
+                if stream:
+                    yield self._create_stream_chunk(f"已上传 {len(media_ids)}/{len(images)} 张图片\n")
 
             # 调用生成API
             if stream:
@@ -752,11 +757,8 @@ class GenerationHandler:
                     # 2张图: 首帧+尾帧
                     if stream:
                         yield self._create_stream_chunk("上传首帧和尾帧图片...\n")
-                    start_media_id = await self.flow_client.upload_image(
-                        at=token.at, image_bytes=images[0], aspect_ratio=model_config["aspect_ratio"], account_id=token.email
-                    )
-                    end_media_id = await self.flow_client.upload_image(
-                        at=token.at, image_bytes=images[1], aspect_ratio=model_config["aspect_ratio"], account_id=token.email
+                    start_media_id, end_media_id = await self.flow_client.upload_images(
+                        at=token.at, images=images[:2], aspect_ratio=model_config["aspect_ratio"], account_id=token.email
                     )
                     debug_logger.log_info(f"[I2V] 上传首尾帧: {start_media_id}, {end_media_id}")
 
@@ -765,14 +767,17 @@ class GenerationHandler:
                 if stream:
                     yield self._create_stream_chunk(f"上传 {image_count} 张参考图片...\n")
 
-                for idx, img in enumerate(images):  # 上传所有图片,不限制数量
-                    media_id = await self.flow_client.upload_image(
-                        at=token.at, image_bytes=img, aspect_ratio=model_config["aspect_ratio"], account_id=token.email
-                    )
-                    reference_images.append({
+                # 并发上传所有图片,不限制数量
+                media_ids = await self.flow_client.upload_images(
+                    at=token.at, images=images, aspect_ratio=model_config["aspect_ratio"], account_id=token.email
+                )
+                reference_images = [
+                    {
                         "imageUsageType": "IMAGE_USAGE_TYPE_ASSET",
                         "mediaId": media_id
-                    })
+                    }
+                    for media_id in media_ids
+                ]
                 debug_logger.log_info(f"[R2V] 上传了 {len(reference_images)} 张参考图片")
 
             # ========== 调用生成API ==========
@@ -827,9 +832,7 @@ class GenerationHandler:
 
             # T2V 或 R2V无图: 纯文本生成
             else:
-                import sys
                 sys.stderr.write(f"\n[DEBUG] GenerationHandler calling generate_video_text for project {project_id}\n")
-                sys.stderr.flush()
                 result = await self.flow_client.generate_video_text(
                     at=token.at,
                     project_id=project_id,
@@ -888,7 +891,8 @@ class GenerationHandler:
             await asyncio.sleep(poll_interval)
 
             try:
-                result = await self.flow_client.check_video_status(
+                # 同一 AT 的并发轮询合并为一次批量查询
+                result = await self.flow_client.check_video_status_batched(
                     at=token.at, 
                     operations=operations,
                     account_id=token.email